@@ -2,12 +2,18 @@
 Author: Yara
 """
 from __future__ import annotations
-import asyncio, json, os
-from typing import Any, Dict, Optional
+import asyncio, contextvars, json, logging, os, sys, threading, time
+from typing import Any, Dict, List, Optional, Tuple
 from google import genai
 from google.genai import types as genai_types
 from app.mcp_client import CarClient
-from app.prompts.car_agent_prompts import build_extraction_prompt, GATEKEEPER_INSTRUCTION
+from app.prompts.car_agent_prompts import (
+    build_extraction_prompt,
+    build_gatekeeper_prompt,
+    EXTRACTION_FREE_TEXT_INSTRUCTION,
+    EXTRACTION_SYSTEM_INSTRUCTION,
+    GATEKEEPER_INSTRUCTION,
+)
 from app.prompts.car_agent_texts import (
     KEY_ORDER,
     RESPONSE_SCHEMA,
@@ -18,6 +24,71 @@ from app.prompts.car_agent_texts import (
     EXTRA_CONSTRAINTS_PROMPT,
 )
 
+# Wait this long after a filter update before prefetching (a quick follow-up answer replaces it)
+PREFETCH_DEBOUNCE_S = 0.4
+# Filters that actually reach the DB (see db_query); prefetch is reused only if these didn't change
+SEARCH_KEYS = ("make", "fuel", "year_min", "price_max")
+
+usage_log = logging.getLogger("app.llm_usage")
+# Own handler, not the root one: per-call accounting always goes to a file (LLM_USAGE_LOG) instead of the chat
+usage_log.propagate = False
+usage_log.setLevel(logging.INFO)
+_usage_handler = logging.FileHandler(os.getenv("LLM_USAGE_LOG", "llm_usage.log"), encoding="utf-8", delay=True)
+_usage_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+usage_log.addHandler(_usage_handler)
+
+# Set inside prefetch tasks (asyncio copies the context per task), so only their log records are affected
+in_prefetch: contextvars.ContextVar[bool] = contextvars.ContextVar("in_prefetch", default=False)
+
+
+class PrefetchLogFilter(logging.Filter):
+    """Drops every record emitted by background prefetches (e.g. 'Executing search_cars...', retry errors),
+    so nothing gets printed over the prompt while the user is typing. A failed prefetch is searched
+    again in the foreground by final_search, which logs as usual."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not in_prefetch.get()
+
+
+# Root handlers come from the vendored client's basicConfig (imported above through CarClient)
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(PrefetchLogFilter())
+
+
+class StdinLines:
+    """
+    Reads stdin lines in a daemon thread and hands them to the event loop through an asyncio.Queue.
+    Unlike asyncio.to_thread(input), a pending prompt doesn't hold the default executor,
+    so Ctrl-C ends the process right away instead of waiting for the next line.
+    """
+    def __init__(self) -> None:
+        self.queue: Optional[asyncio.Queue] = None
+
+    def _start(self) -> None:
+        self.queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        def reader() -> None:
+            while True:
+                line = sys.stdin.readline()
+                loop.call_soon_threadsafe(self.queue.put_nowait, line)
+                if not line:  # EOF
+                    return
+
+        threading.Thread(target=reader, name="stdin-reader", daemon=True).start()
+
+    async def input(self, prompt: str = "") -> str:
+        """Async replacement for input(): prints the prompt and waits for one line."""
+        if self.queue is None:
+            self._start()
+        print(prompt, end="", flush=True)
+        line = await self.queue.get()
+        if not line:
+            raise EOFError
+        return line.rstrip("\n")
+
+
+stdin_lines = StdinLines()
+
 class TerminalCarAgent:
     def __init__(self) -> None:
         api_key = os.getenv("GEMINI_API_KEY")
@@ -26,6 +97,18 @@ class TerminalCarAgent:
         self.client = genai.Client(api_key=api_key)
         self.model_name = "gemini-2.0-flash"  # free-tier-elegible
 
+        # Static instructions go as system instruction, built once per agent ('new' searches reuse them via reset)
+        self.configs: Dict[str, genai_types.GenerateContentConfig] = {
+            "extraction": self._build_config(EXTRACTION_SYSTEM_INSTRUCTION, RESPONSE_SCHEMA),
+            # extra-constraints phase has no CURRENT_FIELD, so it skips those rules (smaller instruction)
+            "extraction_free": self._build_config(EXTRACTION_FREE_TEXT_INSTRUCTION, RESPONSE_SCHEMA),
+            "gatekeeper": self._build_config(GATEKEEPER_INSTRUCTION, PROCEED_SCHEMA),
+        }
+        self.usage: Dict[str, int] = {"calls": 0, "prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears the conversation state for a new search (client, configs and usage totals are kept)."""
         # Unified controler dict: None = 'haven't asked abou the filter'; ""/0 = don't apply filter; real value = apply
         self.filters: Dict[str, Any] = {
             "make": None, "model": None, "fuel": None, "color": None,
@@ -35,6 +118,10 @@ class TerminalCarAgent:
             "has_charger_plug": None, "is_armored": None,
         }
 
+        # Background search started after each filter update (see schedule_prefetch)
+        self._prefetch_key: Optional[Tuple[Any, ...]] = None
+        self._prefetch_task: Optional[asyncio.Task] = None
+
     def apply_extracted_filters(self, parsed: Dict[str, Any]) -> None:
         """Applies 'response JSON' on 'unified controller dictinary', that is, get filters from response."""
         for k, v in (parsed or {}).items():
@@ -47,9 +134,9 @@ class TerminalCarAgent:
                 if v is not None:
                     self.filters[k] = bool(v)
 
-    def relax_filters(self, runs: int) -> Dict[str, Any]:
+    def relax_filters(self, runs: int, base: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """first run drop model, relaxes price and year ; second run drops car maker filter."""
-        relaxed = dict(self.filters)
+        relaxed = dict(self.filters if base is None else base)
         if runs > 1:
             relaxed["make"] = ""      # drop make e encerra
             return relaxed
@@ -63,14 +150,50 @@ class TerminalCarAgent:
             relaxed["price_max"] = int(p * 1.25)
         return relaxed
 
+    def _build_config(self, instruction: str, schema: Dict[str, Any]) -> genai_types.GenerateContentConfig:
+        """Config reused on every call of one kind (instruction + JSON schema)."""
+        return genai_types.GenerateContentConfig(
+            system_instruction=instruction,
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=schema,
+        )
+
+    def _generate(self, kind: str, prompt: str) -> str:
+        """Calls the model and logs latency and token usage per call (plus running totals)."""
+        start = time.perf_counter()
+        resp = self.client.models.generate_content(
+            model=self.model_name,
+            contents=[genai_types.Content(
+                role="user",
+                parts=[genai_types.Part.from_text(prompt)]
+            )],
+            config=self.configs[kind],
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        meta = getattr(resp, "usage_metadata", None)
+        prompt_tokens = getattr(meta, "prompt_token_count", None) or 0
+        output_tokens = getattr(meta, "candidates_token_count", None) or 0
+        cached_tokens = getattr(meta, "cached_content_token_count", None) or 0
+        self.usage["calls"] += 1
+        self.usage["prompt_tokens"] += prompt_tokens
+        self.usage["output_tokens"] += output_tokens
+        self.usage["cached_tokens"] += cached_tokens
+        usage_log.info(
+            f"llm {kind}: {elapsed_ms:.0f} ms, prompt={prompt_tokens} (cached={cached_tokens}) "
+            f"output={output_tokens}, delta_chars={len(prompt)} | totals {self.usage}"
+        )
+        return getattr(resp, "text", None) or ""
+
     def _current_key(self) -> Optional[str]:
         for k in KEY_ORDER:
             if self.filters.get(k) is None:
                 return k
         return None
 
-    def _build_extraction_prompt(self, user_text: str) -> str:
-        return build_extraction_prompt(user_text, self._current_key())
+    def _build_extraction_prompt(self, user_text: str, current_key: Optional[str]) -> str:
+        return build_extraction_prompt(user_text, current_key)
 
     def next_question(self) -> Optional[str]:
         for key in KEY_ORDER:
@@ -82,20 +205,7 @@ class TerminalCarAgent:
         if self.next_question() is not None:
             return False
 
-        full = f"{GATEKEEPER_INSTRUCTION}\n\nUser input:\n{latest_user_text}"
-        resp = self.client.models.generate_content(
-            model=self.model_name,
-            contents=[genai_types.Content(
-                role="user",
-                parts=[genai_types.Part.from_text(full)]
-            )],
-            config=genai_types.GenerateContentConfig(
-                temperature=0,
-                response_mime_type="application/json",
-                response_schema=PROCEED_SCHEMA,
-            ),
-        )
-        raw = (getattr(resp, "text", None) or "")
+        raw = self._generate("gatekeeper", build_gatekeeper_prompt(latest_user_text))
         try:
             parsed = json.loads(raw)
         except Exception:
@@ -103,45 +213,72 @@ class TerminalCarAgent:
         return str(parsed).strip().upper() == "PROCEED"
 
     def extract_and_apply(self, text: str) -> None:
-        full = self._build_extraction_prompt(text)
-        resp = self.client.models.generate_content(
-            model=self.model_name,
-            contents=[genai_types.Content(
-                role="user",
-                parts=[genai_types.Part.from_text(full)]
-            )],
-            config=genai_types.GenerateContentConfig(
-                temperature=0,
-                response_mime_type="application/json",
-                response_schema=RESPONSE_SCHEMA,
-            ),
-        )
-        args = json.loads((getattr(resp, "text", None) or "{}"))
+        current_key = self._current_key()
+        kind = "extraction" if current_key else "extraction_free"
+        raw = self._generate(kind, self._build_extraction_prompt(text, current_key))
+        args = json.loads(raw or "{}")
         self.apply_extracted_filters(args)
 
     async def run(self) -> None:
         print(INTRO_HEADER)
         print(INTRO_EXAMPLES)
 
+        # Client is opened upfront so searches can be prefetched while the user is still answering
+        c = CarClient()
+        await c.initialize()
+        try:
+            if not await self.ask_questions(c):
+                print("Bye."); return
+            rows, notes = await self.final_search(c)
+        finally:
+            self.cancel_prefetch()
+            await c.close()
+
+        for note in notes:
+            print(note)
+
+        if not rows:
+            print("Sorry, at the moment we don't have cars available that matches your search. Please try again")
+            return
+
+        print("\nResults:")
+        for i, car in enumerate(rows, 1):
+            make = car.get("make"); model = car.get("model")
+            year = car.get("year"); color = car.get("color")
+            mileage = car.get("mileage"); price = car.get("dollar_price")
+            km = f"{int(mileage):,}".replace(",", ".") if isinstance(mileage,(int,float)) else str(mileage)
+            pr = "US$ " + f"{int(price):,}".replace(",", ".") if isinstance(price,(int,float)) else str(price)
+            print(f"- {i}. {make} {model} {year}, {color}, {km} km, {pr}")
+
+        print("\nType 'new' to start another search or 'exit' to quit.")
+        if (await stdin_lines.input("> ")).strip().lower() in {"new","again","y","yes"}:
+            self.reset(); await self.run()
+
+    async def ask_questions(self, c: CarClient) -> bool:
+        """
+        Question loop. stdin is read without blocking the loop and LLM calls run in threads, so prefetch tasks keep running meanwhile.
+        Returns False if the user quit.
+        """
         q = self.next_question()
         if q: print(q)
 
         while True:
-            text = input("> ").strip()
+            text = (await stdin_lines.input("> ")).strip()
             if not text:
                 if (q := self.next_question()): print(q)
                 continue
 
             low = text.lower()
             if low in {"exit","quit","sair"}:
-                print("Bye."); return
-            if self.llm_wants_to_proceed(text):
+                return False
+            if await asyncio.to_thread(self.llm_wants_to_proceed, text):
                 break
 
-            self.extract_and_apply(text)
+            await asyncio.to_thread(self.extract_and_apply, text)
+            self.schedule_prefetch(c)
 
             if self.next_question() is not None:
-                if self.llm_wants_to_proceed(text):
+                if await asyncio.to_thread(self.llm_wants_to_proceed, text):
                     break
 
             if (q := self.next_question()):
@@ -151,47 +288,68 @@ class TerminalCarAgent:
 
         print(EXTRA_CONSTRAINTS_PROMPT)
         while True:
-            t = input("> ").strip()
-            if self.llm_wants_to_proceed(t):
+            t = (await stdin_lines.input("> ")).strip()
+            if await asyncio.to_thread(self.llm_wants_to_proceed, t):
                 break
 
-            self.extract_and_apply(t)
+            await asyncio.to_thread(self.extract_and_apply, t)
+            self.schedule_prefetch(c)
+        return True
 
-        c = CarClient()
-        await c.initialize()
-        try:
-            rows = await self.db_query(c, self.filters)
-
-            if not rows:
-                print("No exact match. Looking for similar results...")
-                nf = self.relax_filters(runs=1)
-                rows = await self.db_query(c, nf)
-
-            if not rows or len(rows) < 3:
-                print("Querying additional similar cars...")
-                nf = self.relax_filters(runs=2)
-                more = await self.db_query(c, nf)
-                if more:
-                    rows = (rows or []) + more
-        finally:
-            await c.close()
+    @staticmethod
+    def search_key(query_filters: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(query_filters.get(k) for k in SEARCH_KEYS)
 
-        if not rows:
-            print("Sorry, at the moment we don't have cars available that matches your search. Please try again")
+    def schedule_prefetch(self, c: CarClient) -> None:
+        """Starts (debounced) background search for current filters, cancelling a stale one."""
+        key = self.search_key(self.filters)
+        if key == self._prefetch_key and self._prefetch_task is not None:
             return
+        self.cancel_prefetch()
+        self._prefetch_key = key
+        self._prefetch_task = asyncio.create_task(self._prefetch(c, dict(self.filters)))
+        # superseded tasks are never awaited; retrieve their error so asyncio doesn't warn about it
+        self._prefetch_task.add_done_callback(lambda t: t.cancelled() or t.exception())
 
-        print("\nResults:")
-        for i, car in enumerate(rows, 1):
-            make = car.get("make"); model = car.get("model")
-            year = car.get("year"); color = car.get("color")
-            mileage = car.get("mileage"); price = car.get("dollar_price")
-            km = f"{int(mileage):,}".replace(",", ".") if isinstance(mileage,(int,float)) else str(mileage)
-            pr = "US$ " + f"{int(price):,}".replace(",", ".") if isinstance(price,(int,float)) else str(price)
-            print(f"- {i}. {make} {model} {year}, {color}, {km} km, {pr}")
+    def cancel_prefetch(self) -> None:
+        if self._prefetch_task is not None and not self._prefetch_task.done():
+            self._prefetch_task.cancel()
+        self._prefetch_task = None
+        self._prefetch_key = None
 
-        print("\nType 'new' to start another search or 'exit' to quit.")
-        if input("> ").strip().lower() in {"new","again","y","yes"}:
-            self.__init__(); await self.run()
+    async def _prefetch(self, c: CarClient, query_filters: Dict[str, Any]) -> Tuple[List[Any], List[str]]:
+        in_prefetch.set(True)
+        await asyncio.sleep(PREFETCH_DEBOUNCE_S)
+        return await self.search_with_fallback(c, query_filters)
+
+    async def final_search(self, c: CarClient) -> Tuple[List[Any], List[str]]:
+        """Reuses prefetched result (awaiting it if still in flight) when filters didn't change since."""
+        task = self._prefetch_task
+        if task is not None and self._prefetch_key == self.search_key(self.filters):
+            try:
+                return await task
+            except Exception:
+                pass  # prefetch failed: search again below
+        self.cancel_prefetch()
+        return await self.search_with_fallback(c, dict(self.filters))
+
+    async def search_with_fallback(self, c: CarClient, query_filters: Dict[str, Any]) -> Tuple[List[Any], List[str]]:
+        """Exact search, then relaxed ones. Returns rows and the messages to show the user."""
+        notes: List[str] = []
+        rows = await self.db_query(c, query_filters)
+
+        if not rows:
+            notes.append("No exact match. Looking for similar results...")
+            nf = self.relax_filters(runs=1, base=query_filters)
+            rows = await self.db_query(c, nf)
+
+        if not rows or len(rows) < 3:
+            notes.append("Querying additional similar cars...")
+            nf = self.relax_filters(runs=2, base=query_filters)
+            more = await self.db_query(c, nf)
+            if more:
+                rows = (rows or []) + more
+        return rows, notes
 
     async def db_query(self, c: CarClient, query_filters: Dict[str, Any], limit: int = 50):
         """
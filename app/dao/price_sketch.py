@@ -0,0 +1,15 @@
+import sqlalchemy
+from app.dao.car_market import Base
+
+class DAOPriceSketch(Base):
+    """Price/mileage histograms per segment. Maintained by app.services.price_sketch (never GROUP BY)."""
+    __tablename__ = "car_price_sketch"
+    __table_args__ = (sqlalchemy.UniqueConstraint("make", "model", "year_bucket", name="uq_segment"),)
+
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=True)
+    make = sqlalchemy.Column(sqlalchemy.String(25), nullable=False)
+    model = sqlalchemy.Column(sqlalchemy.String(45), nullable=False)
+    year_bucket = sqlalchemy.Column(sqlalchemy.SmallInteger, nullable=False)
+    n = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=0)
+    price_hist = sqlalchemy.Column(sqlalchemy.JSON, nullable=False)
+    mileage_hist = sqlalchemy.Column(sqlalchemy.JSON, nullable=False)
@@ -58,6 +58,9 @@ class DBConn:
         if self.session:
             self.session.close()
             self.session = None
+        if self.engine:
+            self.engine.dispose()
+            self.engine = None
 
     def add(self, dao_obj):
         self.session.add(dao_obj)
@@ -6,8 +6,9 @@
 from __future__ import annotations
 import argparse, asyncio, json
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 from app.vendor.mcp_client_base import Server
+from app.services.compact_rows import CarRow, FORMAT_COLUMNAR, decode_columnar, is_columnar
 
 CONFIG_PATH = Path(__file__).resolve().parent / "vendor" / "servers_config.json"
 
@@ -15,6 +16,8 @@ class CarClient:
     """
     Start Server via STDIO using config JSON.
     Expses search_cars(**filters) e normalizes returno to List[dict].
+    By default asks server for the compact columnar format and decodes it into CarRow objects
+    (CarRow keeps .get(), so callers can treat it as a dict).
     """
     def __init__(self, server_name: str = "python", config_path: Path = CONFIG_PATH) -> None:
         with open(config_path, "r", encoding="utf-8") as f:
@@ -39,17 +42,27 @@ class CarClient:
             if name: names.append(str(name))
         return names
 
-    async def search_cars(self, **filters: Any) -> List[Dict[str, Any]]:
+    async def search_cars(self, format: str = FORMAT_COLUMNAR, **filters: Any) -> List[Union[CarRow, Dict[str, Any]]]:
         tools = await self.list_tools()
         if "search_cars" not in tools:
             raise RuntimeError("Failed to find 'search_cars' tools.")
-        result = await self.server.execute_tool("search_cars", filters)
+        result = await self.server.execute_tool("search_cars", {**filters, "format": format})
         return self._normalize_rows(result)
 
-    def _normalize_rows(self, result: Any) -> List[Dict[str, Any]]:
+    def _normalize_rows(self, result: Any) -> List[Union[CarRow, Dict[str, Any]]]:
         """
-        Normalizes return as List[dict].
+        Normalizes return as List[dict] (or List[CarRow] for columnar payloads).
+        Structured content is checked first, so the text blob is only parsed as fallback.
         """
+        structured = getattr(result, "structuredContent", None)
+        if isinstance(structured, dict) and "result" in structured:
+            # FastMCP wraps non-object return types (our List | Dict union) as {"result": ...}
+            structured = structured["result"]
+        if is_columnar(structured):
+            return decode_columnar(structured)
+        if isinstance(structured, list):
+            return structured
+
         plain = getattr(result, "model_dump", lambda: result)()
         content = (plain or {}).get("content") if isinstance(plain, dict) else getattr(result, "content", None)
         if isinstance(content, list):
@@ -59,6 +72,8 @@ class CarClient:
                 if isinstance(part, dict) and part.get("type") == "text":
                     try:
                         parsed = json.loads(part.get("text", ""))
+                        if is_columnar(parsed):
+                            return decode_columnar(parsed)
                         if isinstance(parsed, list):
                             return parsed
                     except Exception:
@@ -82,28 +97,32 @@ async def _cli() -> None:
     p.add_argument("--price-min", type=int)
     p.add_argument("--price-max", type=int)
     p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--format", choices=["rows", "columnar"], default=FORMAT_COLUMNAR)
+    p.add_argument("--deal-score", action="store_true")
     a = p.parse_args()
 
     filters = {k: v for k, v in {
         "make": a.make, "fuel": a.fuel, "year_min": a.year_min, "year_max": a.year_max,
-        "price_min": a.price_min, "price_max": a.price_max, "limit": a.limit
+        "price_min": a.price_min, "price_max": a.price_max, "limit": a.limit,
+        "with_deal_score": a.deal_score or None,
     }.items() if v is not None}
 
     client = CarClient()
     try:
         await client.initialize()
-        rows = await client.search_cars(**filters)
+        rows = await client.search_cars(format=a.format, **filters)
         if not rows:
             print("No results")
             return
         for i, car in enumerate(rows, 1):
-            if not isinstance(car, dict):
+            if not isinstance(car, (dict, CarRow)):
                 print(f"- {i}. {car}")
                 continue
             price = car.get("dollar_price")
             price_fmt = f"US${int(price):,}".replace(",", ".") if isinstance(price, (int, float)) else price
             print(f"- {i}. {car.get('make')} {car.get('model')} {car.get('year')}, "
-                  f"{car.get('color')}, {car.get('mileage')} km, {price_fmt}")
+                  f"{car.get('color')}, {car.get('mileage')} km, {price_fmt}"
+                  + (f", deal score {car.get('deal_score')}" if car.get("deal_score") is not None else ""))
     finally:
         await client.close()
 
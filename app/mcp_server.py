@@ -11,12 +11,15 @@ Author: Yara
 Created on: September 2025
 """
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from sqlalchemy import func, and_
 from fastmcp import FastMCP
 
 from app.db_utils.db_connection import DBConn
 from app.dao.car_market import DAOCar
+from app.dao.price_sketch import DAOPriceSketch
+from app.services.compact_rows import FORMAT_COLUMNAR, encode_columnar
+from app.services.price_sketch import SegmentSketch, load_sketches, segment_key, year_bucket
 
 mcp = FastMCP("mcp-server")
 
@@ -25,7 +28,9 @@ mcp = FastMCP("mcp-server")
     name="search_cars",
     description=(
         "Query cars DB with optional filters. "
-        "Returns a list of dicts with: make, model, year, color, mileage, dollar_price and flags."
+        "Returns a list of dicts with: make, model, year, color, mileage, dollar_price and flags. "
+        "Pass format='columnar' for a compact payload (column arrays, dictionary-encoded strings, packed flags). "
+        "with_deal_score=True adds deal_score: % of same make/model/5-year cars listed at a higher price."
     ),
 )
 def search_cars(
@@ -36,26 +41,45 @@ def search_cars(
     price_min: Optional[int] = None,
     price_max: Optional[int] = None,
     limit: Optional[int] = 20,
-) -> List[Dict[str, Any]]:
+    format: Optional[str] = "rows",
+    with_deal_score: bool = False,
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """
     MCP tool. Receives filters, queries the DB and returns results.
+    format: 'rows' (default, list of dicts) or 'columnar' (see app/services/compact_rows.py).
     """
-    session = DBConn().connect()
-    q = session.query(DAOCar)
-
-    if make:
-        q = q.filter(func.lower(DAOCar.make) == make.lower())
-    if year_min is not None:
-        q = q.filter(DAOCar.year >= year_min)
-    if fuel:
-        q = q.filter(func.lower(DAOCar.fuel) == fuel.lower())
-    if price_max is not None and price_max > 0:
-        q = q.filter(DAOCar.dollar_price <= price_max)
-
     if not limit or limit <= 0 or limit > 100:
         limit = 20
 
-    rows = q.limit(limit).all()
+    conn = DBConn()
+    session = conn.connect()
+    try:
+        q = session.query(DAOCar)
+
+        if make:
+            q = q.filter(func.lower(DAOCar.make) == make.lower())
+        if year_min is not None:
+            q = q.filter(DAOCar.year >= year_min)
+        if fuel:
+            q = q.filter(func.lower(DAOCar.fuel) == fuel.lower())
+        if price_max is not None and price_max > 0:
+            q = q.filter(DAOCar.dollar_price <= price_max)
+
+        rows = q.limit(limit).all()
+
+        scores: List[Optional[float]] = []
+        if with_deal_score:
+            # one query for all segments in the page; each score is read from a fixed-size histogram
+            sketches = load_sketches(session, (segment_key(r.make, r.model, r.year) for r in rows))
+            for r in rows:
+                sketch = sketches.get(segment_key(r.make, r.model, r.year))
+                scores.append(sketch.deal_score(r.dollar_price) if sketch else None)
+    finally:
+        # closes the session and the engine pool (one engine per tool call)
+        conn.disconnect()
+
+    if format == FORMAT_COLUMNAR:
+        return encode_columnar(rows, {"deal_score": scores} if with_deal_score else None)
 
     def to_dict(obj: DAOCar) -> Dict[str, Any]:
         return {
@@ -75,7 +99,66 @@ def search_cars(
             "has_bt_radio": getattr(obj, "has_bt_radio", None),
         }
 
-    return [to_dict(r) for r in rows]
+    out = [to_dict(r) for r in rows]
+    for d, score in zip(out, scores):
+        d["deal_score"] = score
+    return out
+
+
+@mcp.tool(
+    name="price_stats",
+    description=(
+        "Price and mileage quantiles (p10, p25, p50, p75, p90) per make/model/5-year bucket. "
+        "Use it to tell if a price is good. Read from precomputed histograms (no table scan)."
+    ),
+)
+def price_stats(
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    merge: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    MCP tool. Returns one entry per segment, or a single merged entry when merge=True.
+    """
+    conn = DBConn()
+    session = conn.connect()
+    try:
+        q = session.query(DAOPriceSketch)
+
+        if make:
+            q = q.filter(func.lower(DAOPriceSketch.make) == make.lower())
+        if model:
+            q = q.filter(func.lower(DAOPriceSketch.model) == model.lower())
+        if year_min is not None:
+            q = q.filter(DAOPriceSketch.year_bucket >= year_bucket(year_min))
+        if year_max is not None:
+            q = q.filter(DAOPriceSketch.year_bucket <= year_max)
+
+        daos = q.order_by(DAOPriceSketch.make, DAOPriceSketch.model, DAOPriceSketch.year_bucket).all()
+    finally:
+        conn.disconnect()
+
+    def to_stats(sketch: SegmentSketch, **segment: Any) -> Dict[str, Any]:
+        return {
+            **segment,
+            "count": sketch.count,
+            "dollar_price": sketch.price.summary(),
+            "mileage": sketch.mileage.summary(),
+        }
+
+    if merge:
+        merged = SegmentSketch()
+        for d in daos:
+            merged.merge(SegmentSketch.from_dao(d))
+        return [to_stats(merged, make=make, model=model, year_min=year_min, year_max=year_max)]
+
+    return [
+        to_stats(SegmentSketch.from_dao(d), make=d.make, model=d.model,
+                 year_bucket=d.year_bucket, year_bucket_end=d.year_bucket + 4)
+        for d in daos
+    ]
 
 
 if __name__ == "__main__":
@@ -28,43 +28,48 @@ GATEKEEPER_INSTRUCTION = (
     "For any other message (including more preferences), return ASK.\n"
 )
 
+# Regras estáticas do CURRENT_FIELD (vão uma vez na system instruction; por turno só vai o delta)
+CURRENT_FIELD_RULES = (
+    "\nEach turn gives CURRENT_FIELD (the field just asked), CURRENT_FIELD_TYPE and the user text.\n"
+    "TASK: Return a JSON object with any keys explicitly stated by the user in THIS message.\n"
+    "ALSO apply this special rule ONLY for CURRENT_FIELD:\n"
+    "  - If the message is negative for CURRENT_FIELD (e.g., 'no', 'none', 'nope', 'n/a', 'na', 'skip', 'any', "
+    "'no preference', or the line is blank), then include CURRENT_FIELD with empty string \"\" (if string) "
+    "or 0 (if numeric).\n"
+    "RULES:\n"
+    "  - Apart from the special rule above, never add, unset or change keys not explicitly stated in this message.\n"
+    "  - If nothing is extractable, return {}.\n"
+    "EXAMPLES (apply to this message only):\n"
+    "  Asked: budget; User: 'no' → {\"price_max\": 0}\n"
+    "  Asked: budget; User: 'No, I want a new Fiat since 2017' → "
+    "{\"price_max\": 0, \"is_new\": true, \"make\": \"Fiat\", \"year_min\": 2017}\n"
+    "  Asked: brand;  User: 'I want a Honda under 30k' → {\"make\": \"Honda\", \"price_max\": 30000}\n"
+)
+
+# System instructions da extração (enviadas em toda chamada, montadas uma vez):
+# durante as perguntas vai com as regras do CURRENT_FIELD; nas restrições extras (sem campo atual) só PROMPT_BASE
+EXTRACTION_SYSTEM_INSTRUCTION = PROMPT_BASE + CURRENT_FIELD_RULES
+EXTRACTION_FREE_TEXT_INSTRUCTION = PROMPT_BASE
+
+NUMERIC_FIELDS = {"price_max", "year_min", "mileage_max"}
+
+
 def build_extraction_prompt(user_text: str, current_key: Optional[str]) -> str:
     """
-    Monta o prompt de extração aceitando múltiplas chaves mencionadas na mesma mensagem
-    e aplicando a regra de 'negativo' somente ao campo atual (CURRENT_FIELD).
+    Monta só a parte do turno (CURRENT_FIELD + texto do usuário).
+    As regras vão como system instruction: EXTRACTION_SYSTEM_INSTRUCTION com campo atual,
+    EXTRACTION_FREE_TEXT_INSTRUCTION sem (current_key None).
     """
-    field_instr = ""
-    if current_key:
-        string_fields = {"make", "model", "fuel", "color"}
-        numeric_fields = {"price_max", "year_min", "mileage_max"}
-        type_hint = (
-            "string" if current_key in string_fields else
-            "numeric" if current_key in numeric_fields else
-            "string"
-        )
-        field_instr = (
-            f"\nCURRENT_FIELD: {current_key}\n"
-            f"CURRENT_FIELD_TYPE: {type_hint}\n"
-            "TASK: Return a JSON object with any keys explicitly stated by the user in THIS message.\n"
-            "ALSO apply this special rule ONLY for CURRENT_FIELD:\n"
-            "  - If the message is negative for CURRENT_FIELD (e.g., 'no', 'none', 'nope', 'n/a', 'na', 'skip', 'any', "
-            "'no preference', or the line is blank), then include CURRENT_FIELD with empty string \"\" (if string) "
-            "or 0 (if numeric).\n"
-            "RULES:\n"
-            "  - Do NOT invent keys. Apart from the special rule above for CURRENT_FIELD, only include keys explicitly "
-            "stated in the text.\n"
-            "  - Never unset or change other keys implicitly; only output keys explicitly stated in this message or "
-            "the special CURRENT_FIELD mapping.\n"
-            "  - If nothing is extractable, return {}.\n"
-            "EXAMPLES (apply to this message only):\n"
-            "  Asked: budget; User: 'no' → {\"price_max\": 0}\n"
-            "  Asked: budget; User: 'No, I want a new Fiat since 2017' → "
-            "{\"price_max\": 0, \"is_new\": true, \"make\": \"Fiat\", \"year_min\": 2017}\n"
-            "  Asked: brand;  User: 'I want a Honda under 30k' → {\"make\": \"Honda\", \"price_max\": 30000}\n"
-        )
-
+    if not current_key:
+        return f"User text:\n{user_text}"
+    type_hint = "numeric" if current_key in NUMERIC_FIELDS else "string"
     return (
-        f"{PROMPT_BASE}{field_instr}\n\n"
-        f"User text:\n{user_text}\n\n"
-        f"Return ONLY a valid JSON object that matches the schema."
+        f"CURRENT_FIELD: {current_key}\n"
+        f"CURRENT_FIELD_TYPE: {type_hint}\n"
+        f"User text:\n{user_text}"
     )
+
+
+def build_gatekeeper_prompt(user_text: str) -> str:
+    """Delta do gatekeeper; GATEKEEPER_INSTRUCTION vai como system instruction."""
+    return f"User input:\n{user_text}"
@@ -0,0 +1,131 @@
+"""
+Compact columnar wire format for search_cars results.
+Column names go once, values go as column arrays. make/model/color/fuel are
+dictionary-encoded (index into a small list) and the 6 boolean flags are packed in one int per row.
+Server encodes (encode_columnar), CarClient decodes (decode_columnar) into CarRow objects.
+
+Author: Yara
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+FORMAT_ROWS = "rows"
+FORMAT_COLUMNAR = "columnar"
+
+PLAIN_COLUMNS = ["id", "year", "mileage", "dollar_price"]
+DICT_COLUMNS = ["make", "model", "color", "fuel"]
+FLAG_COLUMNS = [
+    "is_new", "is_automatic", "has_air_conditioning",
+    "has_charger_plug", "is_armored", "has_bt_radio",
+]
+# Sent only when the server computed them (e.g. search_cars(with_deal_score=True))
+OPTIONAL_COLUMNS = ["deal_score"]
+ROW_FIELDS = ["id", "make", "model", "year", "color", "fuel", "mileage", "dollar_price"] + FLAG_COLUMNS + OPTIONAL_COLUMNS
+
+
+class CarRow:
+    """
+    Lightweight row object (no per-row dict). Keeps .get()/[] so code written for dict rows still works.
+    """
+    __slots__ = tuple(ROW_FIELDS)
+
+    def __init__(self, *values: Any) -> None:
+        """Positional, in ROW_FIELDS order (missing trailing values are None)."""
+        for name, value in zip(ROW_FIELDS, values):
+            setattr(self, name, value)
+        for name in ROW_FIELDS[len(values):]:
+            setattr(self, name, None)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in ROW_FIELDS else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in ROW_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in ROW_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"CarRow({self.make} {self.model} {self.year}, id={self.id})"
+
+
+def encode_columnar(rows: Iterable[Any], extra: Optional[Dict[str, List[Any]]] = None) -> Dict[str, Any]:
+    """
+    Encodes DAOCar objects (or anything with the same attributes) as one columnar payload.
+    Null flags are kept apart in 'flags_null' (only sent when some flag is null).
+    extra: optional per-row columns (name -> values, same order as rows), e.g. deal_score.
+    """
+    data: Dict[str, List[Any]] = {name: [] for name in PLAIN_COLUMNS + DICT_COLUMNS + ["flags"]}
+    dicts: Dict[str, List[str]] = {name: [] for name in DICT_COLUMNS}
+    lookup: Dict[str, Dict[str, int]] = {name: {} for name in DICT_COLUMNS}
+    flags_null: List[int] = []
+
+    for obj in rows:
+        for name in PLAIN_COLUMNS:
+            data[name].append(getattr(obj, name, None))
+
+        for name in DICT_COLUMNS:
+            value = getattr(obj, name, None)
+            if value is None:
+                data[name].append(-1)
+                continue
+            idx = lookup[name].get(value)
+            if idx is None:
+                idx = lookup[name][value] = len(dicts[name])
+                dicts[name].append(value)
+            data[name].append(idx)
+
+        bits = 0
+        nulls = 0
+        for pos, name in enumerate(FLAG_COLUMNS):
+            value = getattr(obj, name, None)
+            if value is None:
+                nulls |= 1 << pos
+            elif value:
+                bits |= 1 << pos
+        data["flags"].append(bits)
+        flags_null.append(nulls)
+
+    if any(flags_null):
+        data["flags_null"] = flags_null
+
+    for name, values in (extra or {}).items():
+        data[name] = list(values)
+
+    return {
+        "format": FORMAT_COLUMNAR,
+        "count": len(data["id"]),
+        "dicts": dicts,
+        "data": data,
+    }
+
+
+def is_columnar(payload: Any) -> bool:
+    return isinstance(payload, dict) and payload.get("format") == FORMAT_COLUMNAR
+
+
+def decode_columnar(payload: Dict[str, Any]) -> List[CarRow]:
+    """
+    Decodes a payload produced by encode_columnar into CarRow objects.
+    Unknown extra columns are ignored, so server can add columns without breaking old clients.
+    """
+    data = payload.get("data") or {}
+    dicts = payload.get("dicts") or {}
+    count = int(payload.get("count") or len(data.get("id") or []))
+
+    # decode column by column, then build each row once (positional, ROW_FIELDS order)
+    columns: Dict[str, List[Any]] = {}
+    for name in PLAIN_COLUMNS + OPTIONAL_COLUMNS:
+        columns[name] = data.get(name) or [None] * count
+    for name in DICT_COLUMNS:
+        values = dicts.get(name) or []
+        columns[name] = [values[i] if 0 <= i < len(values) else None for i in (data.get(name) or [-1] * count)]
+
+    flags = data.get("flags") or [0] * count
+    nulls: List[int] = data.get("flags_null") or [0] * count
+    for pos, name in enumerate(FLAG_COLUMNS):
+        bit = 1 << pos
+        columns[name] = [None if n & bit else bool(b & bit) for b, n in zip(flags, nulls)]
+
+    return [CarRow(*values) for values in zip(*(columns[name] for name in ROW_FIELDS))]
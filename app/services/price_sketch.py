@@ -0,0 +1,191 @@
+"""
+Mergeable price/mileage sketches per segment (make, model, 5-year bucket).
+Each segment keeps two fixed log-spaced histograms. Same bin layout everywhere, so merging is just
+summing counts: seeder/ingest builds sketches for the new rows and merges them into car_price_sketch.
+Quantiles and percentiles are read from the bins (cost depends on bin count only, not on table size).
+
+Author: Yara
+"""
+import bisect
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import tuple_
+from app.dao.car_market import DAOCar
+from app.dao.price_sketch import DAOPriceSketch
+from app.db_utils.db_connection import DBConn
+
+YEAR_BUCKET_SIZE = 5
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def _log_edges(lo: float, hi: float, bins: int) -> List[int]:
+    step = (math.log(hi) - math.log(lo)) / bins
+    return [int(round(math.exp(math.log(lo) + i * step))) for i in range(bins + 1)]
+
+
+# Changing these invalidates stored sketches (run rebuild_price_sketches afterwards)
+PRICE_EDGES = _log_edges(1_000, 10_000_000, 96)
+MILEAGE_EDGES = _log_edges(1_000, 2_000_000, 80)
+
+
+def year_bucket(year: int) -> int:
+    return int(year) - int(year) % YEAR_BUCKET_SIZE
+
+
+def segment_key(make: str, model: str, year: int) -> Tuple[str, str, int]:
+    return (make, model, year_bucket(year))
+
+
+class FixedHistogram:
+    """
+    Histogram over fixed edges. Bin 0 is [0, edges[0]), last bin is [edges[-1], inf).
+    """
+    def __init__(self, edges: List[int], counts: Optional[List[int]] = None) -> None:
+        self.edges = edges
+        self.counts = list(counts) if counts and len(counts) == len(edges) + 1 else [0] * (len(edges) + 1)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts)
+
+    def add(self, value: float, n: int = 1) -> None:
+        self.counts[bisect.bisect_right(self.edges, value)] += n
+
+    def merge(self, other: "FixedHistogram") -> None:
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+
+    def _bin_range(self, i: int) -> Tuple[float, float]:
+        lo = 0 if i == 0 else self.edges[i - 1]
+        hi = self.edges[i] if i < len(self.edges) else self.edges[-1]
+        return lo, max(lo, hi)
+
+    def quantile(self, q: float) -> Optional[int]:
+        total = self.total
+        if not total:
+            return None
+        target = q * total
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= target:
+                lo, hi = self._bin_range(i)
+                return int(round(lo + (hi - lo) * (target - seen) / c))
+            seen += c
+        return self.edges[-1]
+
+    def percentile_of(self, value: float) -> Optional[float]:
+        """Share (0-100) of values below 'value', interpolated inside its bin."""
+        total = self.total
+        if not total:
+            return None
+        i = bisect.bisect_right(self.edges, value)
+        below = sum(self.counts[:i])
+        lo, hi = self._bin_range(i)
+        frac = (value - lo) / (hi - lo) if hi > lo else 0.5
+        below += self.counts[i] * min(1.0, max(0.0, frac))
+        return round(100.0 * below / total, 1)
+
+    def summary(self) -> Dict[str, Optional[int]]:
+        return {f"p{int(q * 100)}": self.quantile(q) for q in QUANTILES}
+
+
+class SegmentSketch:
+    def __init__(self, price_counts: Optional[List[int]] = None, mileage_counts: Optional[List[int]] = None) -> None:
+        self.price = FixedHistogram(PRICE_EDGES, price_counts)
+        self.mileage = FixedHistogram(MILEAGE_EDGES, mileage_counts)
+
+    @property
+    def count(self) -> int:
+        return self.price.total
+
+    def add(self, dollar_price: int, mileage: int) -> None:
+        self.price.add(dollar_price)
+        self.mileage.add(mileage)
+
+    def merge(self, other: "SegmentSketch") -> None:
+        self.price.merge(other.price)
+        self.mileage.merge(other.mileage)
+
+    def deal_score(self, dollar_price: int) -> Optional[float]:
+        """Share (0-100) of the segment listed above this price. Higher = better deal."""
+        pct = self.price.percentile_of(dollar_price)
+        return None if pct is None else round(100.0 - pct, 1)
+
+    @classmethod
+    def from_dao(cls, dao: Any) -> "SegmentSketch":
+        return cls(dao.price_hist, dao.mileage_hist)
+
+
+class SketchBook:
+    """
+    In-memory sketches keyed by segment. Fill it while ingesting rows, then merge_into(session) before commit.
+    """
+    def __init__(self) -> None:
+        self.segments: Dict[Tuple[str, str, int], SegmentSketch] = {}
+
+    def add_car(self, car: Any) -> None:
+        key = segment_key(car.make, car.model, car.year)
+        self.segments.setdefault(key, SegmentSketch()).add(car.dollar_price, car.mileage)
+
+    def merge_into(self, session: Any) -> None:
+        for (make, model, bucket), sketch in self.segments.items():
+            dao = (
+                session.query(DAOPriceSketch)
+                .filter_by(make=make, model=model, year_bucket=bucket)
+                .with_for_update()
+                .one_or_none()
+            )
+            if dao is None:
+                dao = DAOPriceSketch(make=make, model=model, year_bucket=bucket)
+                session.add(dao)
+            else:
+                sketch.merge(SegmentSketch.from_dao(dao))
+            dao.n = sketch.count
+            dao.price_hist = sketch.price.counts
+            dao.mileage_hist = sketch.mileage.counts
+        # sessions run with autoflush=False: flush so a later merge_into (e.g. seeder after backfill)
+        # finds these rows instead of inserting a duplicate segment
+        session.flush()
+        self.segments = {}
+
+
+def ensure_price_sketch_table(engine: Any) -> None:
+    """Creates car_price_sketch when missing (DB volumes created before the table existed)."""
+    DAOPriceSketch.__table__.create(bind=engine, checkfirst=True)
+
+
+def rebuild_price_sketches(session: Any) -> int:
+    """Backfill: drops all sketches and rebuilds them with one scan of car_market. Returns rows scanned."""
+    session.query(DAOPriceSketch).delete()
+    book = SketchBook()
+    rows = session.query(DAOCar.make, DAOCar.model, DAOCar.year, DAOCar.dollar_price, DAOCar.mileage).yield_per(1000)
+    scanned = 0
+    for row in rows:
+        book.add_car(row)
+        scanned += 1
+    book.merge_into(session)
+    return scanned
+
+
+def load_sketches(session: Any, keys: Iterable[Tuple[str, str, int]]) -> Dict[Tuple[str, str, int], SegmentSketch]:
+    """Loads sketches for the given segments in one query."""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    daos = (
+        session.query(DAOPriceSketch)
+        .filter(tuple_(DAOPriceSketch.make, DAOPriceSketch.model, DAOPriceSketch.year_bucket).in_(keys))
+        .all()
+    )
+    return {(d.make, d.model, d.year_bucket): SegmentSketch.from_dao(d) for d in daos}
+
+
+if __name__ == "__main__":
+    conn = DBConn()
+    conn.connect()
+    try:
+        ensure_price_sketch_table(conn.engine)
+        print(f"rebuilt sketches from {rebuild_price_sketches(conn.session)} rows")
+        conn.commit()
+    finally:
+        conn.disconnect()
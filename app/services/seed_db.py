@@ -2,8 +2,10 @@ import random
 import time
 import traceback
 from app.dao.car_market import DAOCar
+from app.dao.price_sketch import DAOPriceSketch
 from app.db_utils.db_connection import DBConn
 from app.services.makers_and_models import MAKERS_AND_MODELS
+from app.services.price_sketch import SketchBook, ensure_price_sketch_table, rebuild_price_sketches
 from datetime import date
 
 
@@ -21,7 +23,9 @@ class DBSeeder:
         for i in range(6): # had too many issues in auto-start seeder
             try:
                 self.create_db_conn()
+                self.backfill_price_sketches()
                 self.add_random_data()
+                self.sketches.merge_into(self.db_conn.session)
                 self.db_conn.commit()
                 time.sleep(2)
                 break
@@ -35,7 +39,14 @@ class DBSeeder:
         self.db_conn = DBConn()
         self.db_conn.connect()
 
+    def backfill_price_sketches(self):
+        """Rows inserted by the SQL script have no sketches yet. Build them once, on first seed."""
+        ensure_price_sketch_table(self.db_conn.engine)
+        if self.db_conn.session.query(DAOPriceSketch.id).first() is None:
+            rebuild_price_sketches(self.db_conn.session)
+
     def add_random_data(self):
+        self.sketches = SketchBook()
         makes = list(MAKERS_AND_MODELS.keys())
         for i in range(self.seed_count):
             make = random.choice(makes)
@@ -57,6 +68,7 @@ class DBSeeder:
             dao.has_bt_radio = random.choice([True, False])
             
             self.db_conn.add(dao)
+            self.sketches.add_car(dao)
 
     @staticmethod
     def mileage_considering_year(car_fabrication_year:int) -> int:
@@ -32,6 +32,18 @@ CREATE TABLE car_market  (
     has_bt_radio BOOL
 );
 
+-- price/mileage histograms per make/model/5-year bucket (maintained incrementally by the seeder/ingest)
+CREATE TABLE car_price_sketch (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    make VARCHAR(25) NOT NULL,
+    model VARCHAR(45) NOT NULL,
+    year_bucket SMALLINT UNSIGNED NOT NULL,
+    n INT UNSIGNED NOT NULL DEFAULT 0,
+    price_hist JSON NOT NULL,
+    mileage_hist JSON NOT NULL,
+    UNIQUE KEY uq_segment (make, model, year_bucket)
+);
+
 -- ================================================== --
 -- seed for test
 -- ================================================== --
@@ -0,0 +1,38 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.dao.car_market import Base, DAOCar
+from app.dao.price_sketch import DAOPriceSketch
+from app.services.price_sketch import SketchBook, rebuild_price_sketches
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    # same session settings as DBConn
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def make_car(year: int, price: int) -> DAOCar:
+    return DAOCar(make="Honda", model="Civic", year=year, color="black", fuel="flex",
+                  mileage=50_000, dollar_price=price)
+
+
+def test_backfill_then_incremental_merge_same_segment():
+    session = make_session()
+    session.add(make_car(2018, 20_000))
+    session.commit()
+
+    # what DBSeeder.run does on first seed: backfill, add new rows, merge, single commit
+    assert rebuild_price_sketches(session) == 1
+    book = SketchBook()
+    car = make_car(2017, 18_000)
+    session.add(car)
+    book.add_car(car)
+    book.merge_into(session)
+    session.commit()
+
+    sketches = session.query(DAOPriceSketch).all()
+    assert len(sketches) == 1
+    assert (sketches[0].make, sketches[0].model, sketches[0].year_bucket) == ("Honda", "Civic", 2015)
+    assert sketches[0].n == 2